@@ -11,11 +11,25 @@
 
 import numpy as np
 import os
-import re
 import sys
 import ntpath
 
-from bayesvp.utilities import get_transitions_params, MyParser
+from bayesvp.utilities import get_transitions_params, read_spectrum, \
+                              compute_lsf_fft, PRECOMPUTED_FFT_MIN_LSF_LENGTH, \
+                              MyParser
+
+
+# Keyword (first token of a line in config file) -> type of the line; 
+# DefineParams groups the config lines into buckets by these types
+CONFIG_KEYWORDS = {'spec_path':'spec_path', 'input':'spec_path', 
+                   'spectrum':'spec_path',
+                   'output':'output', 'chain':'output',
+                   'continuum':'continuum', 'contdegree':'continuum',
+                   'cont_prior':'cont_prior', 'contprior':'cont_prior',
+                   'mcmc_params':'mcmc', 'mcmc':'mcmc',
+                   '%%':'spec', '%':'component',
+                   'lsf':'lsf', 'LSF':'lsf',
+                   'logN':'prior_logN', 'b':'prior_b', 'z':'prior_z'}
 
 
 class DefineParams:
@@ -27,6 +41,9 @@ class DefineParams:
     -----------
     lines: array_like
         All lines containing in config file
+    buckets: dict
+        Tokenized lines of config file grouped by the type of line; 
+        see CONFIG_KEYWORDS
     spec_path: str
         Full path to the spectrum file 
     chain_short_fname: str
@@ -62,6 +79,16 @@ class DefineParams:
         Selected wavelength regions bounds
     vp_params: array_like
     transitions_params_array: array_like
+        Transitions data [oscilator strength, rest wavelength, damping 
+        coefficient, mass of the atom] of each component and region
+    transitions_osc_f, transitions_wave, transitions_gamma, transitions_mass: array
+        Oscillator strength, rest wavelength, damping coefficient and 
+        mass of the atom for every transition of every component and 
+        wavelength region; flattened transitions_params_array
+    transitions_component: array
+        Index of the component of each transition
+    transitions_region: array
+        Index of the wavelength region of each transition
     vp_params_type: array_like
         Voigt profile model parameter types, i.e [logN, b, z]
     vp_params_flags: array_like
@@ -73,6 +100,11 @@ class DefineParams:
         Number of Vogit components defined for the model
     lsf: array_like
         Line spread function to be convolved with the model
+    lsf_norm: list
+        LSF of each wavelength region normalized to unit sum
+    lsf_fft: list
+        Real FFT of each normalized LSF (None for LSFs shorter than 
+        PRECOMPUTED_FFT_MIN_LSF_LENGTH, which are convolved directly)
     cont_normalize: bool
         True if user choose to include continuum fit
     cont_nparams: int
@@ -85,14 +117,20 @@ class DefineParams:
 
         self.config_fname = config_fname
         self.config_basename = ntpath.basename(config_fname)
-        # Read and filter empty lines
-        all_lines = filter(None,(line.rstrip() for line in open(config_fname)))
-
-        # Remove commented lines
+        # Read the config file once; drop empty and commented lines and 
+        # sort the tokenized lines into buckets by their keyword
         self.lines = []
-        for line in all_lines:
-            if not line.startswith('#') and not line.startswith('!'): 
-                self.lines.append(line)    
+        self.buckets = dict((bucket,[]) for bucket in set(CONFIG_KEYWORDS.values()))
+        with open(config_fname) as f_config:
+            for line in f_config:
+                line = line.rstrip()
+                if not line or line.startswith('#') or line.startswith('!'):
+                    continue
+                self.lines.append(line)
+
+                tokens = line.split()
+                if tokens[0] in CONFIG_KEYWORDS:
+                    self.buckets[CONFIG_KEYWORDS[tokens[0]]].append(tokens)
 
 
         ########################################################################
@@ -109,58 +147,55 @@ class DefineParams:
         self.self_bvp_test = False
 
         # Paths and fname strings
-        for line in self.lines:
-            line = filter(None,line.split(' '))
+        for line in self.buckets['spec_path']:
+            if line[1] == 'test_path_to_spec':
+                self.spec_path = (os.path.dirname(os.path.abspath(__file__)) + 
+                                 '/data/example')
+                self.self_bvp_test = True
 
-            if 'spec_path' in line or 'input' in line or 'spectrum' in line:
-                if line[1] == 'test_path_to_spec':
-                    self.spec_path = (os.path.dirname(os.path.abspath(__file__)) + 
-                                     '/data/example')
-                    self.self_bvp_test = True
-
-                else:
-                    self.spec_path = line[1]
-
-            elif 'output' in line or 'chain' in line:
-                self.chain_short_fname = line[1]
-
-            elif 'continuum' in line or 'contdegree' in line:
-                self.cont_normalize  = True
-                self.cont_nparams = int(line[1]) + 1 # n_param = poly degree + 1 (offset)
-
-            elif 'cont_prior' in line or 'contprior' in line:
-                if self.cont_normalize and self.cont_nparams>0:
-                    tmp_priors = [float(i) for i in line[1:]]
-                    # reverse direction to match order of cont params
-                    # {a_i} in polynomial a0*x^0 + a1*x^1 + ....
-                    tmp_priors = tmp_priors[::-1]
-                    if len(tmp_priors) == 1:
-                        # all parameters share the same prior
-                        self.cont_prior = np.ones(self.cont_nparams)*tmp_priors
-                    elif len(tmp_priors) == self.cont_nparams:
-                        # each have its unique prior
-                        self.cont_prior = np.array(tmp_priors)
-                    else:
-                        sys.exit('Please enter only 1 continuum prior or match'
-                                ' the number of continuum parameters. Exiting program..')
+            else:
+                self.spec_path = line[1]
+
+        for line in self.buckets['output']:
+            self.chain_short_fname = line[1]
+
+        for line in self.buckets['continuum']:
+            self.cont_normalize  = True
+            self.cont_nparams = int(line[1]) + 1 # n_param = poly degree + 1 (offset)
+
+        for line in self.buckets['cont_prior']:
+            if self.cont_normalize and self.cont_nparams>0:
+                tmp_priors = [float(i) for i in line[1:]]
+                # reverse direction to match order of cont params
+                # {a_i} in polynomial a0*x^0 + a1*x^1 + ....
+                tmp_priors = tmp_priors[::-1]
+                if len(tmp_priors) == 1:
+                    # all parameters share the same prior
+                    self.cont_prior = np.ones(self.cont_nparams)*tmp_priors
+                elif len(tmp_priors) == self.cont_nparams:
+                    # each have its unique prior
+                    self.cont_prior = np.array(tmp_priors)
                 else:
-                    sys.exit('Continuum fit is not set or degree is less than 0.\n')
-
-            elif 'mcmc_params' in line or 'mcmc' in line:
-                self.nwalkers = int(line[1])
-                self.nsteps   = int(line[2])
-                self.nthreads = int(line[3])
-
-                # Default
-                self.model_selection = 'bic'      
-                self.mcmc_sampler    = 'kombine'
-
-                # Change keys if defined in config 
-                for key in line[3:]:
-                    if key in ['kombine','emcee']:
-                        self.mcmc_sampler = key
-                    elif key in ['aic','bic','bf']:
-                        self.model_selection = key  
+                    sys.exit('Please enter only 1 continuum prior or match'
+                            ' the number of continuum parameters. Exiting program..')
+            else:
+                sys.exit('Continuum fit is not set or degree is less than 0.\n')
+
+        for line in self.buckets['mcmc']:
+            self.nwalkers = int(line[1])
+            self.nsteps   = int(line[2])
+            self.nthreads = int(line[3])
+
+            # Default
+            self.model_selection = 'bic'      
+            self.mcmc_sampler    = 'kombine'
+
+            # Change keys if defined in config 
+            for key in line[3:]:
+                if key in ['kombine','emcee']:
+                    self.mcmc_sampler = key
+                elif key in ['aic','bic','bf']:
+                    self.model_selection = key  
         
         ########################################################################
         # Get the spectral data specified by the config file
@@ -170,13 +205,9 @@ class DefineParams:
         # self.spec_short_fname, self.spec_fname 
         # self.wave, self.flux, self.error 
         ########################################################################
-        for line in self.lines: 
-            if re.search('%%',line):
-                spec_fname_line = line
-
-        spec_data_array = spec_fname_line.split(' ')
+        spec_data_array = self.buckets['spec'][-1]
         self.spec_short_fname = spec_data_array[1]
-        self.spec_fname = self.spec_path + '/' + spec_data_array[1]
+        self.spec_fname = os.path.join(self.spec_path,spec_data_array[1])
 
         # Select spectral range to fit
         if len(spec_data_array[2:]) % 2 != 0:
@@ -185,30 +216,27 @@ class DefineParams:
             self.wave_begins = np.array(spec_data_array[2:][0::2]).astype(float)
             self.wave_ends   = np.array(spec_data_array[2:][1::2]).astype(float)
 
-            for i in range(len(self.wave_begins)):
-                if self.wave_begins[i] >= self.wave_ends[i]:
-                    sys.exit('Starting wavelength cannot be greater or equal to ending wavelength: (%.3f, %.3f); exiting program...' 
-                            % (self.wave_begins[i] ,self.wave_ends[i]))
+            bad = self.wave_begins >= self.wave_ends
+            if bad.any():
+                raise ValueError('Starting wavelength cannot be greater or equal to ending wavelength: %s' 
+                                % ', '.join('(%.3f, %.3f)' % (wave_begin,wave_end) for wave_begin,wave_end 
+                                            in zip(self.wave_begins[bad],self.wave_ends[bad])))
 
-        wave,flux,dflux = np.loadtxt(self.spec_fname,
-                                    unpack=True,usecols=[0,1,2])
+        wave,flux,dflux = read_spectrum(self.spec_fname)
         
         # Select regions of interests 
-        all_inds = []
-        for i in range(len(self.wave_begins)):
-            inds = np.where((wave>=self.wave_begins[i]) & (wave<self.wave_ends[i]))[0]
-            all_inds.append(inds)
-
-        all_inds   = np.hstack(np.array(all_inds))
-        wave = wave[all_inds]; flux = flux[all_inds]; dflux = dflux[all_inds]
+        mask = np.zeros_like(wave,dtype=bool)
+        for wave_begin,wave_end in zip(self.wave_begins,self.wave_ends):
+            mask |= (wave>=wave_begin) & (wave<wave_end)
+        wave = wave[mask]; flux = flux[mask]; dflux = dflux[mask]
         
         # Remove NaN pixels in flux
-        inds = np.where((~np.isnan(flux)))
-        self.wave = wave[inds]; self.flux = flux[inds]; self.dflux = dflux[inds]
+        good = ~np.isnan(flux)
+        self.wave = wave[good]; self.flux = flux[good]; self.dflux = dflux[good]
 
         # Set negative pixels in flux and error 
-        inds = np.where((self.flux < 0)); self.flux[inds] = 0
-        inds = np.where((self.dflux < 0)); self.dflux[inds] = 0
+        np.clip(self.flux,0.0,None,out=self.flux)
+        np.clip(self.dflux,0.0,None,out=self.dflux)
 
         if len(self.wave) == 0 or len(self.flux) == 0 or len(self.dflux) == 0:
             raise SystemExit('No data within specified wavelength range.' \
@@ -231,18 +259,12 @@ class DefineParams:
 
         # Lines in config file that contain the component parameters
         # i.e atom, state, logN, b, z
-        component_lines = []
-        for line in self.lines: 
-            if re.search('%',line):
-                component_lines.append(line)
-        component_lines = component_lines[1:] 
-
+        component_lines = self.buckets['component']
 
         logNs = []; bs = []; redshifts = []
         transitions_params_array = []
         for i in range(len(component_lines)):
             line = component_lines[i]
-            line = filter(None,line.split(' '))
 
             atom  = line[1]; state = line[2] # To obtain transition data
             logNs.append(line[3])
@@ -263,46 +285,68 @@ class DefineParams:
                                                     self.wave_ends[j],float(self.redshift))
                 transitions_params_array[i].append(temp_params)
         
-        # Shape = (n_component,n_regions,n_transitions,4) 
-        self.transitions_params_array = np.array(transitions_params_array)
+        # Shape = (n_component,n_regions,n_transitions,4) if all regions of 
+        # all components have the same number of transitions; otherwise an
+        # object array of shape (n_component,n_regions)
+        n_transitions = set(len(temp_params) for component_params in transitions_params_array
+                            for temp_params in component_params)
+        if len(n_transitions) == 1:
+            self.transitions_params_array = np.array(transitions_params_array)
+        else:
+            self.transitions_params_array = np.empty((len(component_lines),
+                                                      len(self.wave_begins)),dtype=object)
+            for i in range(len(component_lines)):
+                for j in range(len(self.wave_begins)):
+                    self.transitions_params_array[i,j] = transitions_params_array[i][j]
         self.vp_params = np.transpose(np.array([logNs,bs,redshifts]))
         self.n_component = len(component_lines) 
 
+        # Flatten the transitions over (component, region) into contiguous 
+        # arrays with one entry per transition, so that the model can 
+        # compute all of them at once
+        all_params = []; transitions_component = []; transitions_region = []
+        for i in range(self.n_component):
+            for j in range(len(self.wave_begins)):
+                temp_params = transitions_params_array[i][j]
+                temp_params = temp_params[~np.isnan(temp_params).any(axis=1)]
+                all_params.append(temp_params)
+                transitions_component.append(np.full(len(temp_params),i,dtype=int))
+                transitions_region.append(np.full(len(temp_params),j,dtype=int))
+        
+        (self.transitions_osc_f, self.transitions_wave, 
+         self.transitions_gamma, self.transitions_mass) = \
+            np.ascontiguousarray(np.concatenate(all_params).T)
+        self.transitions_component = np.concatenate(transitions_component)
+        self.transitions_region    = np.concatenate(transitions_region)
+
         # Define what kind of parameters to get walker initiazation ranges.
         # and for fixing and freeing paramters. 
         
         # Note that this assumed the pattern of parameters. 
         # will update for continuum parameters. 
-        vp_params_type = [None]*len(self.vp_params.flatten())
-        vp_params_type[::3]  = ['logN'] * (len(vp_params_type[::3]))
-        vp_params_type[1::3] = ['b']    * (len(vp_params_type[1::3]))
-        vp_params_type[2::3] = ['z']    * (len(vp_params_type[2::3]))
-        
+        vp_params_type = np.tile(['logN','b','z'],self.n_component)
 
         flat_params = self.vp_params.flatten()
         flags = np.zeros(len(flat_params))
 
-        letters = [None]*len(flat_params)
-        for i in range(len(flat_params)):
-            for j in range(len(flat_params[i])):
-                if flat_params[i][j].isalpha():
-                    letters[i] = flat_params[i][j]
-        unique_letters = filter(None,list(set(letters)))
-
-        n_free_params_counter = 0
-        for i in range(len(letters)):
-            if letters[i] == None:
-                flags[i] = n_free_params_counter
-                n_free_params_counter += 1
+        # A trailing letter fixes (upper case) or ties (lower case) a parameter;
+        # free parameters have no letter ('')
+        letters = np.array([x[-1] if x[-1:].isalpha() else '' for x in flat_params])
+        unique_letters,letter_inds = np.unique(letters,return_inverse=True)
+
+        free = letters == ''
+        n_free_params_counter = int(np.sum(free))
+        flags[free] = np.arange(n_free_params_counter)
 
-        for unique_letter in unique_letters:
-            inds = [i for i, x in enumerate(letters) if x == unique_letter]
+        for i,unique_letter in enumerate(unique_letters):
+            if not unique_letter:
+                continue
+            inds = letter_inds == i
             if unique_letter.islower(): 
                 flags[inds] = n_free_params_counter
                 n_free_params_counter += 1
             else:
-                for index in inds:
-                    flags[index] = None
+                flags[inds] = np.nan
 
         # Model uses these to construct sets of (logN, b, z) for each component
         self.vp_params_type  = np.array(vp_params_type)
@@ -314,35 +358,21 @@ class DefineParams:
         # Make directories for data products
         if self.self_bvp_test:
             # write to local direcotry if it is test to avoid permission issues in bayesvp library location
-            self.output_path = '.' + '/bvp_output_z' + str(self.redshift)
+            self.output_path = os.path.join('.','bvp_output_z' + str(self.redshift))
 
         else:
-            self.output_path = self.spec_path + '/bvp_output_z' + str(self.redshift)
+            self.output_path = os.path.join(self.spec_path,'bvp_output_z' + str(self.redshift))
 
-        self.mcmc_outputpath = self.output_path + '/chains'
+        self.mcmc_outputpath = os.path.join(self.output_path,'chains')
         
-        self.data_product_path = self.output_path +'/data_products'
-        self.data_product_path_files = self.data_product_path + '/ascii'
-        self.data_product_path_plots = self.data_product_path + '/plots'
-        self.chain_fname = self.mcmc_outputpath + '/' + self.chain_short_fname
-
-        try: 
-            os.makedirs(self.mcmc_outputpath)
-        except OSError:
-            if not os.path.isdir(self.mcmc_outputpath):
-                raise
-
-        try: 
-            os.makedirs(self.data_product_path_files)
-        except OSError:
-            if not os.path.isdir(self.data_product_path_files):
-                raise
-
-        try: 
-            os.makedirs(self.data_product_path_plots)
-        except OSError:
-            if not os.path.isdir(self.data_product_path_plots):
-                raise
+        self.data_product_path = os.path.join(self.output_path,'data_products')
+        self.data_product_path_files = os.path.join(self.data_product_path,'ascii')
+        self.data_product_path_plots = os.path.join(self.data_product_path,'plots')
+        self.chain_fname = os.path.join(self.mcmc_outputpath,self.chain_short_fname)
+
+        os.makedirs(self.mcmc_outputpath,exist_ok=True)
+        os.makedirs(self.data_product_path_files,exist_ok=True)
+        os.makedirs(self.data_product_path_plots,exist_ok=True)
 
         ########################################################################
         # Determine the LSF by specifying LSF filename with 
@@ -353,15 +383,13 @@ class DefineParams:
         ########################################################################
 
         # Check if LSF is specified in config file
-        defined_lsf = False
-        for line in self.lines:
-            if re.search('lsf',line) or re.search('LSF',line):
-                lsf_line = line.split(' ')[1:]
-                defined_lsf = True
-                if not os.path.isdir(self.spec_path + '/database'):
-                    os.mkdir(self.spec_path + '/database')
-                    sys.exit('Require LSF file to be in %s' % self.spec_path + '/database\n Exiting program...')
-                break
+        defined_lsf = len(self.buckets['lsf']) > 0
+        if defined_lsf:
+            lsf_line = self.buckets['lsf'][0][1:]
+            lsf_path = os.path.join(self.spec_path,'database')
+            if not os.path.isdir(lsf_path):
+                os.makedirs(lsf_path,exist_ok=True)
+                sys.exit('Require LSF file to be in %s\n Exiting program...' % lsf_path)
 
         # Get the LSF function from directory 'database'
         if defined_lsf:
@@ -369,12 +397,12 @@ class DefineParams:
                 self.lsf = []
                 for lsf_fname in lsf_line:
                     # assume lsf file has one column 
-                    fname = self.spec_path + '/database/' + lsf_fname
+                    fname = os.path.join(lsf_path,lsf_fname)
                     self.lsf.append(np.loadtxt(fname))
             elif len(lsf_line) == 1:
                 for lsf_fname in lsf_line:
                     # assume lsf file has one column 
-                    fname = self.spec_path + '/database/' + lsf_fname
+                    fname = os.path.join(lsf_path,lsf_fname)
                     self.lsf = np.loadtxt(fname)
             else:
                 sys.exit('Please check if number of LSF matches wavelength regions. Exiting program...')
@@ -382,6 +410,20 @@ class DefineParams:
             # Convolve with LSF = 1
             self.lsf = np.ones(len(self.wave_begins))
 
+        # Normalize the LSF of each region once here rather than for 
+        # every model evaluation
+        if defined_lsf and len(lsf_line) != len(self.wave_begins):
+            # One LSF shared by all regions
+            self.lsf_norm = [self.lsf/np.sum(self.lsf)]*len(self.wave_begins)
+        else:
+            self.lsf_norm = [np.atleast_1d(lsf/np.sum(lsf)) for lsf in self.lsf]
+
+        # Likewise the FFT of each LSF long enough for FFT convolution 
+        # with the model flux to be faster than direct convolution
+        self.lsf_fft = [compute_lsf_fft(lsf,len(self.wave)) 
+                        if len(lsf) >= PRECOMPUTED_FFT_MIN_LSF_LENGTH else None 
+                        for lsf in self.lsf_norm]
+
         
         #######################################################################
         # Read priors and use them for walker initialization 
@@ -396,33 +438,30 @@ class DefineParams:
         #######################################################################
         
         self.priors = np.zeros((3,2))
-        for line in self.lines:
-            line = np.array(line.split(' '))
-            line = filter(None,line)
-            if 'logN' in line:
-                if len(line) != 3:
-                    sys.exit('Error! In config file, format for logN prior:\n logN min_logN max_logN\nExiting program...')
-                self.priors[0] = [float(line[1]),float(line[2])]
-
-            if 'b' in line:
-                if len(line) != 3:
-                    sys.exit('Error! In config file, format for b prior:\n z min_b max_b\nExiting program...')
-                self.priors[1] = [float(line[1]),float(line[2])]
-
-            if 'z' in line:
-                c = 299792.458 # speed of light [km/s]
-                if len(line) == 4:
-                    center_z,min_dv,max_dv = float(line[1]),float(line[2]),float(line[3])
-                    if min_dv == max_dv:
-                        min_dv = -min_dv
-                    min_z,max_z = center_z+min_dv/c,center_z+max_dv/c
-                elif len(line) == 3:
-                    center_z,dv = float(line[1]),float(line[2])
-                    min_z,max_z = center_z-dv/c,center_z+dv/c
-                else:
-                    sys.exit('Error! In config file, format for z prior:\n z center_z |min_dv| |max_dv|\nor\n' + 
-                            ' z center_z dv\nThe latter option will use +/- dv [km/s]')
-                self.priors[2] = [min_z,max_z]
+        for line in self.buckets['prior_logN']:
+            if len(line) != 3:
+                sys.exit('Error! In config file, format for logN prior:\n logN min_logN max_logN\nExiting program...')
+            self.priors[0] = [float(line[1]),float(line[2])]
+
+        for line in self.buckets['prior_b']:
+            if len(line) != 3:
+                sys.exit('Error! In config file, format for b prior:\n z min_b max_b\nExiting program...')
+            self.priors[1] = [float(line[1]),float(line[2])]
+
+        for line in self.buckets['prior_z']:
+            c = 299792.458 # speed of light [km/s]
+            if len(line) == 4:
+                center_z,min_dv,max_dv = float(line[1]),float(line[2]),float(line[3])
+                if min_dv == max_dv:
+                    min_dv = -min_dv
+                min_z,max_z = center_z+min_dv/c,center_z+max_dv/c
+            elif len(line) == 3:
+                center_z,dv = float(line[1]),float(line[2])
+                min_z,max_z = center_z-dv/c,center_z+dv/c
+            else:
+                sys.exit('Error! In config file, format for z prior:\n z center_z |min_dv| |max_dv|\nor\n' + 
+                        ' z center_z dv\nThe latter option will use +/- dv [km/s]')
+            self.priors[2] = [min_z,max_z]
     
     def print_config_params(self):
 
@@ -431,12 +470,12 @@ class DefineParams:
         with open(self.output_path + '/' + self.config_basename,'w') as f_config:
             # Paths and fname strings
             for line in self.lines:
-                tmp_line = filter(None,line.split(' '))
+                tmp_line = line.split()
 
                 if 'spec_path' in tmp_line or 'input' in tmp_line or 'spectrum' in tmp_line:
                     if tmp_line[1] == 'test_path_to_spec':
                         cwd = os.getcwd()
-                        print cwd + self.output_path[1:]
+                        print(cwd + self.output_path[1:])
                         f_config.write('spec_path %s\n' % (cwd + self.output_path[1:]))
                 else:
                     f_config.write('%s\n' % line)
@@ -18,7 +18,7 @@ from scipy.interpolate import interp1d
 
 
 from bayesvp.vp_model import continuum_model_flux
-from bayesvp.utilities import write_mcmc_stats, compute_burnin_GR
+from bayesvp.utilities import write_mcmc_stats, compute_burnin_GR, read_gr_data
 from bayesvp.utilities import MyParser,extrapolate_pdf,triage
 from bayesvp.config import DefineParams
 
@@ -102,7 +102,7 @@ class ProcessModel:
             f.write('# %sx1e5\t%s\n' % (param_type, 'log10(pdf)'))
         else:
             f.write('# %s\t%s\n' % (param_type, 'log10(pdf)'))
-        for i in xrange(len(x)):
+        for i in range(len(x)):
             if not np.isinf(log_pdf[i]):
                 f.write('%.4f\t%.16f\n' % (x[i], log_pdf[i]))
         f.close()
@@ -225,11 +225,11 @@ class ProcessModel:
         as a function of steps
         """
         gr_fname = self.config_param.chain_fname + '_GR.dat'
-        data = np.loadtxt(gr_fname,unpack=True)
+        data = read_gr_data(gr_fname)
         steps = data[0]; grs = data[1:]
         
         plt.figure(1,figsize=(6,6))
-        for i in xrange(len(grs)):
+        for i in range(len(grs)):
             plt.plot(steps,grs[i]-1,lw=1.5,label=self.gr_param_label[i])
             
         plt.legend(loc='best')
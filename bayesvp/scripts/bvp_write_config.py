@@ -37,69 +37,69 @@ class WriteBayesVPConfig:
         self.mcmc_sampler    = 'kombine'
 
     def interactive_var(self):
-        self.spec_path    = raw_input('Path to spectrum:\n')
-        self.spec_fname   = raw_input('Spectrum filename: ')
-        self.output_chain_fname = raw_input('filename for output chain: ')
-        self.atom         = raw_input('atom: ')
-        self.state        = raw_input('state: ')
-        self.auto         = int(raw_input('Maximum number of components to try: '))
-        self.wave_start   = float(raw_input('Starting wavelength: '))
-        self.wave_end     = float(raw_input('Ending wavelength: '))
+        self.spec_path    = input('Path to spectrum:\n')
+        self.spec_fname   = input('Spectrum filename: ')
+        self.output_chain_fname = input('filename for output chain: ')
+        self.atom         = input('atom: ')
+        self.state        = input('state: ')
+        self.auto         = int(input('Maximum number of components to try: '))
+        self.wave_start   = float(input('Starting wavelength: '))
+        self.wave_end     = float(input('Ending wavelength: '))
         
         print('\nNow enter the priors. Press Enter for default values.')
         self.min_logN = 0; self.max_logN = 24 
 
         try:
-            self.min_logN = float(raw_input('min logN = '))
+            self.min_logN = float(input('min logN = '))
         except ValueError:
             self.min_logN = 0
 
         try:
-            self.max_logN = float(raw_input('max logN = '))
+            self.max_logN = float(input('max logN = '))
         except ValueError:
             self.max_logN = 24
 
         try:
-            self.min_b = float(raw_input('min b = '))
+            self.min_b = float(input('min b = '))
         except ValueError:
             self.min_b = 0
 
         try:
-            self.max_b = float(raw_input('max b = '))
+            self.max_b = float(input('max b = '))
         except ValueError:
             self.max_b = 100
 
         try:
-            self.central_redshift = float(raw_input('central redshift = '))
+            self.central_redshift = float(input('central redshift = '))
         except ValueError:
             self.central_redshift = 0
 
         try:
-            self.velocity_range   = float(raw_input('velocity range [km/s] = '))
+            self.velocity_range   = float(input('velocity range [km/s] = '))
         except ValueError:
             self.velocity_range = 300
 
         print('\nNow enter the MCMC parameters..')
         try:
-            self.nwalkers = int(raw_input('Number of walkers: '))
+            self.nwalkers = int(input('Number of walkers: '))
         except ValueError:
             self.nwalkers = 100
         
         try:
-            self.nsteps   = int(raw_input('Number of steps:  '))
+            self.nsteps   = int(input('Number of steps:  '))
         except ValueError:
             self.nsteps = 200
 
         try:
-            self.nthreads = int(raw_input('Number of processes: '))
+            self.nthreads = int(input('Number of processes: '))
         except ValueError:
             self.nthreads = 4
 
-        self.model_selection = raw_input('Model selection method bic(default),aic,bf: ')
+        self.model_selection = input('Model selection method bic(default),aic,bf: ')
         if self.model_selection == '':
             self.model_selection = 'bic'
         
-        self.mcmc_sampler = raw_input('MCMC sampler kombine(default), emcee: ')
+        self.mcmc_sampler = input('MCMC sampler kombine(default), emcee: ')
         if self.mcmc_sampler == '':
             self.mcmc_sampler = 'kombine'
 
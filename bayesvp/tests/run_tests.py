@@ -3,12 +3,14 @@ import unittest
 from bayesvp.tests import test_config
 from bayesvp.tests import test_likelihood
 from bayesvp.tests import test_model
+from bayesvp.tests import test_utilities
 
 suites = []
 
 suites.append(unittest.TestLoader().loadTestsFromTestCase(test_config.TCConfigFile))
 suites.append(unittest.TestLoader().loadTestsFromTestCase(test_likelihood.TCPosterior))
 suites.append(unittest.TestLoader().loadTestsFromTestCase(test_model.TCSingleVP))
+suites.append(unittest.TestLoader().loadTestsFromTestCase(test_utilities.TCConvolveLSF))
 
 
 # Run tests
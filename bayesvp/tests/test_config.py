@@ -4,7 +4,8 @@ import sys
 import numpy as np
 
 from bayesvp.config import DefineParams
-from bayesvp.utilities import get_bayesvp_Dir
+from bayesvp.utilities import get_bayesvp_Dir, compute_lsf_fft, \
+                              PRECOMPUTED_FFT_MIN_LSF_LENGTH
 
 """
 TEST CASE 1: OVI line with stock config file and spectrum
@@ -59,6 +60,106 @@ class TCConfigFile(unittest.TestCase):
 
 
 
+    def test_bad_wavelength_range(self):
+        import tempfile
+        with open(self.config_ex) as f:
+            config_text = f.read().replace('1030.000000 1033.000000','1033.000000 1030.000000')
+        
+        f_config = tempfile.NamedTemporaryFile(mode='w',suffix='.dat',delete=False)
+        f_config.write(config_text); f_config.close()
+        try:
+            self.assertRaises(ValueError,DefineParams,f_config.name)
+        finally:
+            os.remove(f_config.name)
+
+    def test_two_ions(self):
+        # OVI has two transitions and HI has one within the region
+        import tempfile
+        with open(self.config_ex) as f:
+            config_text = f.read().replace('1030.000000 1033.000000','1020.000000 1040.000000')
+        config_text = config_text.replace('% O VI 15 30 0.000000',
+                                          '% O VI 15 30 0.000000\n% H I 14 20 0.000100')
+        
+        f_config = tempfile.NamedTemporaryFile(mode='w',suffix='.dat',delete=False)
+        f_config.write(config_text); f_config.close()
+        try:
+            config_params = DefineParams(f_config.name)
+        finally:
+            os.remove(f_config.name)
+
+        self.assertEqual(config_params.n_component,2)
+        self.assertEqual(np.shape(config_params.transitions_params_array),(2,1))
+        self.assertEqual(np.shape(config_params.transitions_params_array[0][0]),(2,4))
+        self.assertEqual(np.shape(config_params.transitions_params_array[1][0]),(1,4))
+        self.assertEqual(config_params.transitions_component.tolist(),[0,0,1])
+        self.assertEqual(config_params.transitions_region.tolist(),[0,0,0])
+        np.testing.assert_allclose(config_params.transitions_wave,
+                                   [1031.9261,1037.6167,1025.7223])
+
+        from bayesvp.likelihood import Posterior
+        lnprob = Posterior(config_params)
+        self.assertTrue(np.isfinite(lnprob(np.array([15,20,0,14,20,0.0001]))))
+
+        import shutil
+        shutil.rmtree(config_params.output_path)
+
+    def test_lsf(self):
+        import tempfile
+        import shutil
+        from bayesvp.likelihood import Posterior
+
+        # Spectrum and LSF files in a temporary spec_path/database
+        spec_path = tempfile.mkdtemp()
+        os.mkdir(spec_path + '/database')
+        shutil.copy(self.config_params.spec_fname,spec_path)
+        lsf = np.exp(-np.linspace(-3,3,21)**2)
+        np.savetxt(spec_path + '/database/lsf1.dat',lsf)
+        np.savetxt(spec_path + '/database/lsf2.dat',lsf)
+        # long enough for its FFT to be precomputed
+        long_lsf = np.exp(-np.linspace(-3,3,PRECOMPUTED_FFT_MIN_LSF_LENGTH)**2)
+        np.savetxt(spec_path + '/database/lsf3.dat',long_lsf)
+
+        with open(self.config_ex) as f:
+            config_text = f.read().replace('test_path_to_spec',spec_path)
+        config_text = config_text.replace('1030.000000 1033.000000',
+                                          '1030.000000 1033.000000 1036.000000 1039.000000')
+        
+        lnprobs = []
+        try:
+            for lsf_line in ['lsf lsf1.dat lsf2.dat','lsf lsf1.dat']:
+                config_fname = spec_path + '/config.dat'
+                with open(config_fname,'w') as f_config:
+                    f_config.write(config_text + lsf_line + '\n')
+                config_params = DefineParams(config_fname)
+
+                # One LSF per region, or the same LSF shared by all regions
+                self.assertEqual(len(config_params.lsf_norm),2)
+                self.assertEqual(len(config_params.lsf_fft),2)
+                for lsf_norm in config_params.lsf_norm:
+                    np.testing.assert_allclose(lsf_norm,lsf/np.sum(lsf))
+                # Short LSFs are convolved directly
+                self.assertEqual(config_params.lsf_fft,[None,None])
+
+                lnprobs.append(Posterior(config_params)(np.array([15,20,0])))
+
+            with open(config_fname,'w') as f_config:
+                f_config.write(config_text + 'lsf lsf3.dat\n')
+            config_params = DefineParams(config_fname)
+            for lsf_fft in config_params.lsf_fft:
+                self.assertEqual(len(lsf_fft),
+                                 len(compute_lsf_fft(long_lsf,len(config_params.wave))))
+            lnprob_fft = Posterior(config_params)(np.array([15,20,0]))
+            # Same likelihood with direct convolution
+            config_params.lsf_fft = [None,None]
+            lnprob_direct = Posterior(config_params)(np.array([15,20,0]))
+        finally:
+            shutil.rmtree(spec_path)
+
+        self.assertTrue(np.isfinite(lnprobs[0]))
+        self.assertAlmostEqual(lnprobs[0],lnprobs[1])
+        self.assertTrue(np.isfinite(lnprob_fft))
+        self.assertAlmostEqual(lnprob_fft,lnprob_direct)
+
     def test_example_mcmc_params(self):
         self.assertEqual(self.config_params.mcmc_sampler,'kombine')
         self.assertEqual(self.config_params.model_selection,'bic')
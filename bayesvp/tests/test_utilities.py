@@ -0,0 +1,79 @@
+import unittest
+import os
+import sys
+import numpy as np
+
+from bayesvp.utilities import convolve_lsf, compute_lsf_fft, FFT_MIN_LSF_LENGTH
+
+###############################################################################
+# TEST CASE 1: LSF convolution against direct convolution with np.convolve
+###############################################################################
+
+def direct_convolve_lsf(flux,lsf):
+    """Reference: direct convolution of 1-flux with the normalized LSF"""
+    lsf = np.atleast_1d(lsf)
+    if len(flux) < len(lsf):
+        padding = np.ones(len(lsf)-len(flux)+1)
+        flux = np.concatenate((padding,flux))
+        conv_flux = 1-np.convolve(1-flux,lsf,mode='same')/np.sum(lsf)
+        return conv_flux[len(padding):]
+    else:
+        return 1-np.convolve(1-flux,lsf,mode='same')/np.sum(lsf)
+
+class TCConvolveLSF(unittest.TestCase):
+
+    def setUp(self):
+        # Absorption line and Gaussian LSFs with odd and even lengths
+        x = np.linspace(-5,5,501)
+        self.flux = 1-0.9*np.exp(-x**2)
+        self.lsfs = [np.exp(-np.linspace(-3,3,n)**2) for n in (21,20)]
+        # long enough to be convolved with FFT
+        self.long_lsfs = [np.exp(-np.linspace(-3,3,n)**2) for n in 
+                          (FFT_MIN_LSF_LENGTH+1,FFT_MIN_LSF_LENGTH)]
+
+    def test_delta_lsf(self):
+        np.testing.assert_allclose(convolve_lsf(self.flux,1),self.flux,
+                                   rtol=0,atol=1e-15)
+        np.testing.assert_allclose(convolve_lsf(self.flux,[3.0]),self.flux,
+                                   rtol=0,atol=1e-15)
+
+    def test_convolution(self):
+        for lsf in self.lsfs + self.long_lsfs:
+            conv_flux = convolve_lsf(self.flux,lsf)
+            self.assertEqual(np.shape(conv_flux),np.shape(self.flux))
+            np.testing.assert_allclose(conv_flux,direct_convolve_lsf(self.flux,lsf),
+                                       rtol=0,atol=1e-12)
+
+            conv_flux = convolve_lsf(self.flux,lsf/np.sum(lsf),normalized=True)
+            np.testing.assert_allclose(conv_flux,direct_convolve_lsf(self.flux,lsf),
+                                       rtol=0,atol=1e-12)
+
+    def test_precomputed_fft(self):
+        for lsf in self.lsfs:
+            lsf_norm = lsf/np.sum(lsf)
+            lsf_fft = compute_lsf_fft(lsf_norm,len(self.flux))
+            conv_flux = convolve_lsf(self.flux,lsf_norm,normalized=True,lsf_fft=lsf_fft)
+            self.assertEqual(np.shape(conv_flux),np.shape(self.flux))
+            np.testing.assert_allclose(conv_flux,direct_convolve_lsf(self.flux,lsf),
+                                       rtol=0,atol=1e-12)
+
+    def test_mismatched_fft(self):
+        # FFT computed for a longer spectrum falls back to fftconvolve
+        for lsf in self.lsfs:
+            lsf_norm = lsf/np.sum(lsf)
+            lsf_fft = compute_lsf_fft(lsf_norm,4*len(self.flux))
+            conv_flux = convolve_lsf(self.flux,lsf_norm,normalized=True,lsf_fft=lsf_fft)
+            np.testing.assert_allclose(conv_flux,direct_convolve_lsf(self.flux,lsf),
+                                       rtol=0,atol=1e-12)
+
+    def test_padding(self):
+        flux = self.flux[240:255]
+        for lsf in self.lsfs + self.long_lsfs + [np.exp(-np.linspace(-3,3,40)**2)]:
+            conv_flux = convolve_lsf(flux,lsf)
+            self.assertEqual(np.shape(conv_flux),np.shape(flux))
+            np.testing.assert_allclose(conv_flux,direct_convolve_lsf(flux,lsf),
+                                       rtol=0,atol=1e-12)
+
+
+if __name__ == '__main__':
+    unittest.main()
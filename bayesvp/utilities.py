@@ -12,10 +12,19 @@ import re
 import os
 import sys
 import argparse
+from functools import lru_cache
 from scipy.special import gamma
+from scipy.signal import fftconvolve
+from scipy.fftpack import next_fast_len
 
 import matplotlib.pyplot as plt
 
+# pandas is optional; its C parser is much faster than np.loadtxt
+# for reading large ascii spectra
+try:
+	import pandas as pd
+except ImportError:
+	pd = None
 
 
 ###############################################################################
@@ -38,7 +47,7 @@ def determine_autovp(config_fname):
 
 		f = open(new_config_fname,'w')
 		for line in normal_lines:
-			temp_line = line.split(' ')
+			temp_line = line.split()
 			
 			# Add the number of component at the end of output chain filename
 			if 'output' in temp_line or 'chain' in temp_line:
@@ -49,7 +58,7 @@ def determine_autovp(config_fname):
 				f.write(line); f.write('\n')
 		
 		for line in component_line:
-			for n in xrange(1,n_component+1):
+			for n in range(1,n_component+1):
 				f.write(line); f.write('\n')
 		f.close()
 
@@ -62,7 +71,7 @@ def determine_autovp(config_fname):
 	for line in all_lines:
 		if line.startswith('!'): 
 			if re.search('auto', line) or re.search('AUTO', line): 
-				line = line.split(' ')
+				line = line.split()
 				if len(line) == 3:
 					n_component_min = 1 
 					n_component_max = int(line[2])
@@ -72,7 +81,7 @@ def determine_autovp(config_fname):
 				auto_vp = True
 
 		elif re.search('%',line):
-			if line.split(' ')[0] == '%':
+			if line.split()[0] == '%':
 				component_line.append(line)
 			else:
 				normal_lines.append(line)
@@ -81,7 +90,7 @@ def determine_autovp(config_fname):
 
 	if auto_vp:
 		# Produce Config files
-		for n in xrange(n_component_min,n_component_max+1):
+		for n in range(n_component_min,n_component_max+1):
 			replicate_config(config_fname,normal_lines,component_line,n)
 
 	return auto_vp, n_component_min, n_component_max
@@ -100,13 +109,13 @@ def model_info_criterion(obs_spec_obj):
 	#if obs_spec_obj.model_selection.lower() in ('odds','bf'):
 	#	return local_density_bf(obs_spec_obj) 
 
-	from likelihood import Posterior
+	from bayesvp.likelihood import Posterior
 	# Define the posterior function based on data
 	lnprob = Posterior(obs_spec_obj)
 
 	data_length = len(obs_spec_obj.flux)
 
-	chain = np.load(obs_spec_obj.chain_fname + '.npy')
+	chain = _load_chain(obs_spec_obj.chain_fname)
 	n_params = np.shape(chain)[-1]
 	samples = chain.reshape((-1,n_params))
 	medians = np.median(samples,axis=0) # shape = (n_params,)
@@ -153,12 +162,12 @@ def model_info_criterion(obs_spec_obj):
 #
 #	Assuming we need only L(M) at a given point.
 #	"""
-#	from likelihood import Posterior
+#	from bayesvp.likelihood import Posterior
 #	from kombine.clustered_kde import ClusteredKDE
 #
 #	# Define the posterior function based on data
 #	lnprob = Posterior(obs_spec_obj)
-#	chain = np.load(obs_spec_obj.chain_fname + '.npy')
+#	chain = _load_chain(obs_spec_obj.chain_fname)
 #	n_params = np.shape(chain)[-1]
 #	samples = chain.reshape((-1,n_params))
 #
@@ -169,7 +178,7 @@ def model_info_criterion(obs_spec_obj):
 #	sub_sample = ksample.draw(n_sample) 
 #
 #	logp = np.zeros(n_sample)
-#	for i in xrange(n_sample):
+#	for i in range(n_sample):
 #		logp[i] = lnprob(sub_sample[i])
 #
 #	bf,dbf = estimate_bayes_factor(sub_sample.T,logp)
@@ -201,7 +210,7 @@ def compare_model(L1,L2,model_selection):
 #	"""
 #	from sklearn.neighbors import KernelDensity
 #
-#	chain = np.load(chain_fname + '.npy')
+#	chain = _load_chain(chain_fname)
 #	n_params = np.shape(chain)[-1]
 #	samples = chain.reshape((-1,n_params))
 #	kde = KernelDensity(kernel='gaussian',bandwidth=1).fit(samples)
@@ -220,10 +229,18 @@ def compare_model(L1,L2,model_selection):
 # Process chain
 ###############################################################################
 
+def _load_chain(chain_fname):
+	"""
+	Memory-map the MCMC chain (chain_fname + '.npy') read-only so that
+	only the slices being used are read from disk. Copy the returned 
+	array before modifying it.
+	"""
+	return np.load(chain_fname + '.npy',mmap_mode='r')
+
 def compute_stats(x):
-	xmed = np.median(x); xm = np.mean(x); xsd = np.std(x)
-	xcfl11 = np.percentile(x,16); xcfl12 = np.percentile(x,84)
-	xcfl21 = np.percentile(x,2.5); xcfl22 = np.percentile(x,97.5)	
+	# All percentiles (median included) from a single call
+	xcfl21,xcfl11,xmed,xcfl12,xcfl22 = np.percentile(x,[2.5,16,50,84,97.5])
+	xm = np.mean(x); xsd = np.std(x)
 	return xmed,xm,xsd,xcfl11, xcfl12, xcfl21,xcfl22
     
 
@@ -231,29 +248,28 @@ def read_mcmc_fits(config_params_obj,para_name):
     
 	my_dict = {'logN':0, 'b':1,'z':2}
 	col_num = my_dict[para_name]
-	chain = np.load(config_params_obj.chain_fname + '.npy')
+	chain = _load_chain(config_params_obj.chain_fname)
 	burnin = compute_burnin_GR(config_params_obj.chain_fname + '_GR.dat')
 	x = chain[burnin:,:,col_num].flatten()
 	xmed,xm,xsd,xcfl11, xcfl12, xcfl21,xcfl22 = compute_stats(x)
 	return xmed 
 
 def write_mcmc_stats(config_params_obj,output_fname):
-	chain = np.load(config_params_obj.chain_fname + '.npy')
+	chain = _load_chain(config_params_obj.chain_fname)
 	burnin = compute_burnin_GR(config_params_obj.chain_fname + '_GR.dat')
 	
+	n_params = np.shape(chain)[-1]
+	samples = chain[burnin:].reshape((-1,n_params))
+
+	# Statistics of all parameters at once; each has shape (n_params,)
+	xcfl21,xcfl11,xmed,xcfl12,xcfl22 = np.percentile(samples,
+											[2.5,16,50,84,97.5],axis=0)
+	xm = np.mean(samples,axis=0); xsd = np.std(samples,axis=0)
+
 	f = open(output_fname,'w')
 	f.write('x_med\tx_mean\tx_std\tx_cfl11\tx_cfl12\t x_cfl21\tx_cfl22\n')
-	
-	n_params = np.shape(chain)[-1]
-	for i in xrange(n_params):
-		x            = chain[burnin:,:,i].flatten()
-		output_stats = compute_stats(x)
-		f.write('%f\t%f\t%f\t%f\t%f\t%f\t%f\n' % 
-				(output_stats[0],output_stats[1],
-				 output_stats[2],output_stats[3],
-				 output_stats[4],output_stats[5],
-				 output_stats[6]))
-		
+	np.savetxt(f,np.c_[xmed,xm,xsd,xcfl11,xcfl12,xcfl21,xcfl22],
+				fmt='%f',delimiter='\t')
 	f.close()
 	return
 
@@ -296,10 +312,10 @@ def extrapolate_pdf(x,pdf,left_boundary_x,right_boundary_x,x_stepsize,slope=10):
         log_pdf = np.concatenate((log_pdf,right_pdf))        
 
     # Normalize the pdf
-	pdf_tmp2  = 10**log_pdf/np.sum((10**log_pdf)*(x_stepsize))
-	inds = np.where(pdf_tmp2<0)[0]
-	pdf_tmp2[inds] = np.min(pdf_tmp2)
-	log_pdf = np.log10(pdf_tmp2)
+    pdf_tmp2  = 10**log_pdf/np.sum((10**log_pdf)*(x_stepsize))
+    inds = np.where(pdf_tmp2<0)[0]
+    pdf_tmp2[inds] = np.min(pdf_tmp2)
+    log_pdf = np.log10(pdf_tmp2)
     return new_x, log_pdf
 
 
@@ -308,25 +324,101 @@ def extrapolate_pdf(x,pdf,left_boundary_x,right_boundary_x,x_stepsize,slope=10):
 # Line Spread Function 
 ###############################################################################
 
+@lru_cache(maxsize=64)
 def gaussian_kernel(std):
+    # Cached by std; the returned array is shared, so it is read-only
     var = std**2
     size = 8*std +1 # this gaurantees size to be odd.
     x = np.linspace(-100,100,size)
     norm = 1/(2*np.pi*var)
-    return norm*np.exp(-(x**2/(2*std**2)))
+    kernel = norm*np.exp(-(x**2/(2*std**2)))
+    kernel.setflags(write=False)
+    return kernel
+
+# LSF length from which FFT convolution beats direct convolution 
+# with np.convolve for spectra of ~10^3-10^4 pixels
+FFT_MIN_LSF_LENGTH = 400
+# Likewise when the FFT of the LSF is precomputed with compute_lsf_fft
+PRECOMPUTED_FFT_MIN_LSF_LENGTH = 150
+
+def _convolve_same(x,lsf):
+	"""Direct convolution for short LSFs, FFT convolution otherwise"""
+	if len(lsf) < FFT_MIN_LSF_LENGTH:
+		return np.convolve(x,lsf,mode='same')
+	return fftconvolve(x,lsf,mode='same')
+
+def compute_lsf_fft(lsf_norm,n_pixels):
+	"""
+	Real FFT of the normalized LSF, zero padded for convolution with 
+	a spectrum of n_pixels; see convolve_lsf
+
+	Parameters:
+	----------
+	lsf_norm: array_like
+		line spread function normalized to unit sum
+	n_pixels: int
+		length of the flux array to be convolved with the LSF
+
+	Return:
+	----------
+	lsf_fft: array_like
+		real FFT of lsf_norm
+	"""
+	n_fft = next_fast_len(n_pixels+len(lsf_norm)-1)
+	return np.fft.rfft(lsf_norm,n_fft)
 
-def convolve_lsf(flux,lsf):
-	if len(flux) < len(np.atleast_1d(lsf)):
+def convolve_lsf(flux,lsf,normalized=False,lsf_fft=None):
+	"""
+	Convolve the flux with the line spread function (LSF). LSFs 
+	shorter than FFT_MIN_LSF_LENGTH are convolved directly; FFT 
+	convolution, O(N log N) instead of O(N*M) for a spectrum of 
+	length N and an LSF of length M, only pays off for longer LSFs.
+
+	Parameters:
+	----------
+	flux: array_like
+		normalized flux
+	lsf: array_like
+		line spread function
+	normalized: bool
+		True if lsf is already normalized to unit sum (e.g., lsf_norm 
+		of the config object), which saves normalizing it on every call
+	lsf_fft: array_like
+		Optional precomputed FFT of the normalized LSF from 
+		compute_lsf_fft (e.g., lsf_fft of the config object); 
+		it is used only if it matches the length of flux
+
+	Return:
+	----------
+	conv_flux: array_like
+		flux convolved with the LSF; same length as the input flux
+	"""
+	lsf = np.atleast_1d(lsf)
+	if not normalized:
+		lsf = lsf/np.sum(lsf)
+
+	if len(lsf) == 1:
+		# LSF is a delta function
+		return 1-(1-flux)*lsf[0]
+
+	elif len(flux) < len(lsf):
 		# Add padding to make sure to return the same length in flux.
 		padding = np.ones(len(lsf)-len(flux)+1)
-		flux = np.hstack([padding,flux])
-    	
-		conv_flux = 1-np.convolve(1-flux,lsf,mode='same') /np.sum(lsf)
+		flux = np.concatenate((padding,flux))
+
+		conv_flux = 1-_convolve_same(1-flux,lsf)
 		return conv_flux[len(padding):]
 
-	else:
-		# convolve 1-flux to remove edge effects wihtout using padding
-		return 1-np.convolve(1-flux,lsf,mode='same') /np.sum(lsf)
+	elif lsf_fft is not None:
+		n_fft = next_fast_len(len(flux)+len(lsf)-1)
+		if len(lsf_fft) == n_fft//2+1:
+			# convolve 1-flux to remove edge effects wihtout using padding
+			conv_flux = np.fft.irfft(np.fft.rfft(1-flux,n_fft)*lsf_fft,n_fft)
+			i_start = (len(lsf)-1)//2
+			return 1-conv_flux[i_start:i_start+len(flux)]
+
+	# convolve 1-flux to remove edge effects wihtout using padding
+	return 1-_convolve_same(1-flux,lsf)
 
 ###############################################################################
 # Convergence 
@@ -348,23 +440,45 @@ def gr_indicator(chain):
 	"""
 	nsteps,nwalkers,ndim = np.shape(chain)
 	nsteps = float(nsteps); nwalkers = float(nwalkers)
-    
-	Rgrs = np.zeros(ndim)
-	for n in xrange(ndim):
-		x = chain[:,:,n]
-		# average of within-chain variance over all walkers
-		W = np.mean(np.var(x,axis=0)) # i.e within-chain variance
-		mean_x_per_chain = np.mean(x,axis=0)
-		mean_x = np.mean(mean_x_per_chain) 
-
-		# Variance between chains 
-		B = nsteps*np.sum((mean_x_per_chain - mean_x)**2) / (nwalkers-1)
-		var_per_W = 1 - 1./nsteps + B/(W*nsteps) 
-
-		Rgrs[n] = ((nwalkers+1)/nwalkers) * var_per_W - (nsteps-1)/(nwalkers*nsteps)
-        
+
+	# All parameters at once; each quantity below has shape (ndim,)
+	# average of within-chain variance over all walkers
+	W = np.mean(np.var(chain,axis=0),axis=0) # i.e within-chain variance
+	mean_x_per_chain = np.mean(chain,axis=0) # shape = (nwalkers,ndim)
+	mean_x = np.mean(mean_x_per_chain,axis=0) 
+
+	# Variance between chains 
+	B = nsteps*np.sum((mean_x_per_chain - mean_x)**2,axis=0) / (nwalkers-1)
+	var_per_W = 1 - 1./nsteps + B/(W*nsteps) 
+
+	Rgrs = ((nwalkers+1)/nwalkers) * var_per_W - (nsteps-1)/(nwalkers*nsteps)
 	return Rgrs 
 
+# Parsed GR files keyed by filename; see read_gr_data()
+_GR_DATA = {}
+
+def read_gr_data(gr_fname):
+	"""
+	Read the Gelman-Rubin (GR) file written by bvp_mcmc_single. The
+	parsed data are cached and reused unless the modification time 
+	of the file changes. 
+
+	Parameters
+	----------
+	gr_fname:str
+		Full path to the GR file
+
+	Returns
+	----------
+	data: array_like
+		First row as steps and the rest as the values of GR for 
+		each model parameter. Shared by callers; do not modify.
+	"""
+	mtime = os.path.getmtime(gr_fname)
+	if gr_fname not in _GR_DATA or _GR_DATA[gr_fname][0] != mtime:
+		_GR_DATA[gr_fname] = (mtime,np.loadtxt(gr_fname,unpack=True))
+	return _GR_DATA[gr_fname][1]
+
 def compute_burnin_GR(gr_fname,gr_threshold=1.005):
 	"""
 	Calculate the steps where the chains are 
@@ -384,7 +498,7 @@ def compute_burnin_GR(gr_fname,gr_threshold=1.005):
 		The step number where the least converged parameter has 
 		converged; (maxiumn of the steps of all parameters) 
 	"""
-	data = np.loadtxt(gr_fname,unpack=True)
+	data = read_gr_data(gr_fname)
 	steps = data[0]; grs = data[1:]
 	indices = np.argmax(grs<=gr_threshold,axis=1)
 	# burnin_steps
@@ -402,6 +516,46 @@ def linear_continuum(wave,flux,m,b):
 	continuum = straight_line(wave,m,b)
 	return flux * continuum
 
+# Atomic data from ./data/atom.dat; loaded once by _load_atom_data()
+_ATOM_DATA = None
+
+def _load_atom_data():
+	"""
+	Read ./data/atom.dat on the first call and cache it at module 
+	scope, since it is static and needed for every component and 
+	wavelength region. 
+
+	Return:
+	----------
+	atom_data: tuple
+		(atoms, states, rest wavelengths, oscilator strengths, 
+		damping coefficients, masses of the atoms [grams], indices 
+		that sort the wavelengths, sorted wavelengths)
+	"""
+	global _ATOM_DATA
+	if _ATOM_DATA is None:
+		amu = 1.66053892e-24   # 1 atomic mass in grams
+
+		# Absolute path for BayseVP
+		data_path = os.path.dirname(os.path.abspath(__file__)) 
+		data_file = data_path + '/data/atom.dat'
+		if pd is not None:
+			atom_data = pd.read_csv(data_file,sep=r'\s+',header=None,comment='#',
+									keep_default_na=False,dtype={0:str,1:str},
+									float_precision='high')
+			atoms = atom_data[0].to_numpy(dtype=str)
+			states = atom_data[1].to_numpy(dtype=str)
+			wave,osc_f,Gamma,mass = atom_data[[2,3,4,5]].to_numpy(dtype=np.float64).T
+		else:
+			atoms,states  = np.loadtxt(data_file, dtype=str,unpack=True,usecols=[0,1])
+			wave,osc_f,Gamma,mass = np.loadtxt(data_file,unpack=True,usecols=[2,3,4,5])
+		mass = mass*amu 
+
+		wave_order = np.argsort(wave,kind='mergesort')
+		_ATOM_DATA = (atoms,states,wave,osc_f,Gamma,mass,
+					  wave_order,wave[wave_order])
+	return _ATOM_DATA
+
 def get_transitions_params(atom,state,wave_start,wave_end,redshift):
 	"""
 	Extract the ionic and tranisiton properties based on the atom and 
@@ -425,20 +579,14 @@ def get_transitions_params(atom,state,wave_start,wave_end,redshift):
 	transitions_params_array: array_like
 		[oscilator strength, rest wavelength, dammping coefficient, mass of the atom] for all transitions within the wavelength interval. shape = (number of transitions, 4) 
 	"""
-	amu = 1.66053892e-24   # 1 atomic mass in grams
+	atoms,states,wave,osc_f,Gamma,mass,wave_order,sorted_wave = _load_atom_data()
 
-	# Absolute path for BayseVP
-	data_path = os.path.dirname(os.path.abspath(__file__)) 
-	data_file = data_path + '/data/atom.dat'
-	atoms,states  = np.loadtxt(data_file, dtype=str,unpack=True,usecols=[0,1])
-	wave,osc_f,Gamma,mass = np.loadtxt(data_file,unpack=True,usecols=[2,3,4,5])
-	mass = mass*amu 
-
-	inds = np.where((atoms == atom) & 
-					(states == state) &
-					(wave >= wave_start/(1+redshift)) & 
-					(wave < wave_end/(1+redshift)))[0]
- 
+	# Binary search for the wavelength window on the sorted wavelengths, 
+	# then keep the transitions in the order of atom.dat
+	i_start,i_end = np.searchsorted(sorted_wave,[wave_start/(1+redshift),
+												wave_end/(1+redshift)])
+	inds = np.sort(wave_order[i_start:i_end])
+	inds = inds[(atoms[inds] == atom) & (states[inds] == state)]
 
 	if len(inds) == 0:
 		sys.exit('Could not find any transitions of %s%s in wavelength range. ' % (atom,state) +
@@ -447,6 +595,30 @@ def get_transitions_params(atom,state,wave_start,wave_end,redshift):
 		return np.array([osc_f[inds],wave[inds],Gamma[inds], mass[inds]]).T
 
 
+def read_spectrum(spec_fname):
+	"""
+	Read the first three columns of a whitespace delimited spectrum
+	file. Use pandas if available, otherwise fall back to np.loadtxt.
+
+	Parameters:
+	----------
+	spec_fname: str
+		Full path to the spectrum file with columns [wave,flux,error]
+
+	Return:
+	----------
+	wave,flux,dflux: array_like
+		wavelength, flux and uncertainty of flux of the spectrum
+	"""
+	if pd is not None:
+		data = pd.read_csv(spec_fname,sep=r'\s+',header=None,comment='#',
+						   usecols=[0,1,2],dtype=np.float64,
+						   float_precision='high').to_numpy()
+		return data.T
+	else:
+		return np.loadtxt(spec_fname,unpack=True,usecols=[0,1,2])
+
+
 def conf_interval(x, pdf, conf_level):
     return np.sum(pdf[pdf > x])-conf_level
 
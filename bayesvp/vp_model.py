@@ -53,7 +53,7 @@ def wavelength_array(wave_start, wave_end, dv):
     wave_start = float(wave_start); wave_end = float(wave_end)
 
     # Calcualte Total number of pixel given the resultion and bounds of spectrum
-    total_number_pixel = np.int(np.log10(wave_end/wave_start) / 
+    total_number_pixel = int(np.log10(wave_end/wave_start) / 
                                 np.log10(1 + dv/c) + 0.5)
     array_index        = np.arange(0,total_number_pixel,1)
     
@@ -160,7 +160,7 @@ def general_intensity(logN, b, z, wave, atomic_params):
     tau = N*sigma0*f*voigt_profile_line(b,z,nu,nu0,gamma)
 
     # Return Normalized intensity
-    return np.exp(-tau.astype(np.float))
+    return np.exp(-tau.astype(float))
 
 def simple_spec(logN, b, z, wave, atom=None, state=None, lsf=1):
     """
@@ -193,14 +193,14 @@ def simple_spec(logN, b, z, wave, atom=None, state=None, lsf=1):
     n_transitions = len(atomic_params)
     
     spec = []
-    for l in xrange(n_transitions):
+    for l in range(n_transitions):
         if not np.isnan(atomic_params[l]).any():
             model_flux = general_intensity(logN,b,z,wave,atomic_params[l]) 
             spec.append(convolve_lsf(model_flux,lsf)) 
         else:
             return np.ones(wave)
     # Return the convolved model flux with LSF
-    return np.product(spec,axis=0)
+    return np.prod(spec,axis=0)
 
 def generic_prediction(alpha, obs_spec_obj):
     """
@@ -226,40 +226,42 @@ def generic_prediction(alpha, obs_spec_obj):
     """
     component_flags = obs_spec_obj.vp_params_flags.reshape(obs_spec_obj.n_component,3)
 
-    spec = [] 
-    for i in xrange(obs_spec_obj.n_component):
-        # Re-group parameters intro [logN, b,z] for each component
-
-        temp_alpha = np.zeros(3)
-        for j in xrange(3):
+    # Re-group parameters intro [logN, b,z] for each component
+    component_alpha = np.zeros((obs_spec_obj.n_component,3))
+    for i in range(obs_spec_obj.n_component):
+        for j in range(3):
             # NaN indicates parameter has been fixed
             if np.isnan(component_flags[i][j]): 
                 # access the fixed value from vp_params after removing the upper case letter 
-                temp_alpha[j] = float(obs_spec_obj.vp_params[i][j][:-1])
+                component_alpha[i][j] = float(obs_spec_obj.vp_params[i][j][:-1])
             else: 
                 # access the index map from flags to alpha 
-                temp_alpha[j] = alpha[int(component_flags[i][j])] 
-
-
-        # Compute spectrum for each component, region, and transition.
-        n_wavelength_regions = len(obs_spec_obj.wave_begins)
- 
-        for k in xrange(n_wavelength_regions):  
-            n_transitions = len(obs_spec_obj.transitions_params_array[i][k])
-            for l in xrange(n_transitions):
-                if not np.isnan(obs_spec_obj.transitions_params_array[i][k][l]).any():
-                    model_flux = general_intensity(temp_alpha[0],temp_alpha[1],temp_alpha[2],obs_spec_obj.wave,obs_spec_obj.transitions_params_array[i][k][l])
-
-                    # Convolve (potentially )LSF for each region 
-                    spec.append(convolve_lsf(model_flux,obs_spec_obj.lsf[k])) 
+                component_alpha[i][j] = alpha[int(component_flags[i][j])] 
+
+    # [logN, b, z] of the component of each transition, as columns
+    logN,b,z = component_alpha[obs_spec_obj.transitions_component].T[:,:,np.newaxis]
+    atomic_params = [obs_spec_obj.transitions_osc_f[:,np.newaxis],
+                     obs_spec_obj.transitions_wave[:,np.newaxis],
+                     obs_spec_obj.transitions_gamma[:,np.newaxis],
+                     obs_spec_obj.transitions_mass[:,np.newaxis]]
+
+    # Compute spectrum for each component, region, and transition at once; 
+    # shape = (n_transitions, n_pixels)
+    model_flux = general_intensity(logN,b,z,obs_spec_obj.wave,atomic_params)
+
+    # Convolve (potentially )LSF for each region 
+    spec = [convolve_lsf(model_flux[l],obs_spec_obj.lsf_norm[k],normalized=True,
+                         lsf_fft=obs_spec_obj.lsf_fft[k])
+            for l,k in enumerate(obs_spec_obj.transitions_region)]
     
     # Return the convolved model flux with LSF
-    return np.product(spec,axis=0)
+    return np.prod(spec,axis=0)
 
 def poly_continuum(wave,flux, *params):
-    # arbitrary polynomial continuum
+    # arbitrary polynomial continuum; np.polyval uses Horner's scheme 
+    # rather than computing every power of x
     x = wave-np.median(wave)
-    return sum([p*(x**i) for i, p in enumerate(params)]) + np.median(flux)
+    return np.polyval(params[::-1],x) + np.median(flux)
 
 def continuum_model_flux(alpha,obs_spec_obj):
     """